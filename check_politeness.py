@@ -1,75 +1,190 @@
 import re
 from collections import defaultdict
 import time
-from urllib.parse import urlparse
 import glob
 import os
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from utils import get_netloc
+
+# Matches worker download entries, e.g.
+# "2025-01-01 12:00:00,123 - Worker-0 - INFO - Downloaded https://..., status <200>, ..."
+# Log files are scanned as raw bytes, so the pattern is a bytes pattern.
+LOG_PATTERN = re.compile(rb'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - Worker-\d+ - INFO - Downloaded (https?://[^\s,]+)')
+
+# Violations kept per domain as samples for the report
+MAX_VIOLATION_SAMPLES = 5
+
+# Epoch seconds of the start of each local 'YYYY-MM-DD HH:MM' minute seen in the logs
+_minute_starts = {}
+
+def parse_timestamp(timestamp_str):
+    """
+    Convert a 'YYYY-MM-DD HH:MM:SS,mmm' log timestamp to epoch seconds.
+    Milliseconds are ignored. The fields sit at fixed offsets, so they are
+    sliced out directly and only the minute goes through mktime, once per
+    minute. The UTC offset can change during a day (DST), so it is resolved
+    per minute rather than per day.
+    """
+    minute = timestamp_str[:16]
+    minute_start = _minute_starts.get(minute)
+    if minute_start is None:
+        minute_start = time.mktime((int(minute[0:4]), int(minute[5:7]), int(minute[8:10]),
+                                    int(minute[11:13]), int(minute[14:16]), 0, 0, 0, -1))
+        _minute_starts[minute] = minute_start
+    return minute_start + int(timestamp_str[17:19])
 
 def get_main_domain(url):
     """Extract main domain from URL"""
-    parsed = urlparse(url)
-    domain = parsed.netloc.lower()
+    return main_domain_from_netloc(get_netloc(url))
+
+# Main domains the crawler enforces politeness on
+MAIN_DOMAINS = frozenset({'ics.uci.edu', 'cs.uci.edu', 'informatics.uci.edu', 'stat.uci.edu'})
+
+@lru_cache(maxsize=4096)
+def main_domain_from_netloc(netloc):
+    """Map a netloc to its main domain; a log only holds a handful of distinct hosts"""
+    domain = netloc.lower()
     
-    # Map to main domains
-    if 'ics.uci.edu' in domain:
-        return 'ics.uci.edu'
-    elif 'cs.uci.edu' in domain:
-        return 'cs.uci.edu'
-    elif 'informatics.uci.edu' in domain:
-        return 'informatics.uci.edu'
-    elif 'stat.uci.edu' in domain:
-        return 'stat.uci.edu'
+    # Map to main domains by the last three labels of the host
+    host = domain.partition(':')[0]
+    candidate = '.'.join(host.rsplit('.', 3)[-3:])
+    if candidate in MAIN_DOMAINS:
+        return candidate
     return domain
 
-def analyze_logs(log_files):
-    """Analyze multiple crawler log files for politeness"""
-    # Track last access time for each main domain
-    domain_last_access = defaultdict(float)
-    # Track violations
+def delay_stats(timestamps, threshold=0.5, max_samples=MAX_VIOLATION_SAMPLES):
+    """
+    Compute delays between consecutive sorted timestamps of one domain in a
+    single pass, without keeping the delays around.
+    Returns (delay_sum, delay_count, min_delay, max_delay, violation_count,
+    violations), where violations holds at most max_samples (i, delay) pairs
+    for the gap before timestamps[i].
+    """
+    delay_sum = 0.0
+    min_delay = float('inf')
+    max_delay = 0.0
+    violation_count = 0
+    violations = []
+    for i in range(1, len(timestamps)):
+        delay = timestamps[i] - timestamps[i - 1]
+        delay_sum += delay
+        if delay < min_delay:
+            min_delay = delay
+        if delay > max_delay:
+            max_delay = delay
+        if delay < threshold:
+            violation_count += 1
+            if len(violations) < max_samples:
+                violations.append((i, delay))
+    delay_count = max(len(timestamps) - 1, 0)
+    if not delay_count:
+        min_delay = 0.0
+    return delay_sum, delay_count, min_delay, max_delay, violation_count, violations
+
+def tail_lines(log_file, n, chunk_size=65536):
+    """Return the last n lines of a file as bytes, reading backwards in chunks"""
+    with open(log_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        buf = b''
+        while pos > 0 and buf.count(b'\n') <= n:
+            step = min(chunk_size, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+    return buf.splitlines()[-n:] if n > 0 else []
+
+def collect_entries(lines, log_name):
+    """
+    Collect download entries from byte lines of one log, grouped by main domain.
+    Each entry is a (timestamp, timestamp_str, url, log_file) tuple.
+    """
+    entries = defaultdict(list)
+    for line in lines:
+        # Cheap substring test first; most log lines are not downloads
+        if b' - Downloaded ' not in line:
+            continue
+        match = LOG_PATTERN.match(line)
+        if match:
+            # Only matched lines are decoded; both groups are plain ASCII
+            timestamp_str = match.group(1).decode('ascii')
+            url = match.group(2).decode('ascii', errors='replace')
+            entries[get_main_domain(url)].append(
+                (parse_timestamp(timestamp_str), timestamp_str, url, log_name))
+    return entries
+
+def parse_log_file(log_file, tail=None):
+    """
+    Collect download entries from one log file, grouped by main domain.
+    If tail is given, only the last tail lines of the file are read.
+    """
+    log_name = os.path.basename(log_file)
+    if tail is not None:
+        return collect_entries(tail_lines(log_file, tail), log_name)
+    # mmap cannot map an empty file
+    if os.path.getsize(log_file) == 0:
+        return defaultdict(list)
+    with open(log_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return collect_entries(iter(mm.readline, b''), log_name)
+
+def analyze_logs(log_files, tail=None):
+    """
+    Analyze multiple crawler log files for politeness.
+    If tail is given, only the last tail lines of each file are checked.
+    """
+    # Download entries for each main domain across all files
+    domain_entries = defaultdict(list)
+    # Track violations: total count plus a few samples per domain
     violations = defaultdict(list)
+    violation_counts = defaultdict(int)
     # Track statistics
     stats = {
         'total_requests': defaultdict(int),
-        'avg_delay': defaultdict(list),
+        'delay_sum': defaultdict(float),
+        'delay_count': defaultdict(int),
         'min_delay': defaultdict(float),
         'max_delay': defaultdict(float)
     }
     
-    # Regular expression to match log entries
-    log_pattern = re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - Worker-\d+ - INFO - Downloaded (https?://[^\s,]+)')
-    
     for log_file in log_files:
         print(f"\nAnalyzing {log_file}...")
-        with open(log_file, 'r') as f:
-            for line in f:
-                match = log_pattern.search(line)
-                if match:
-                    timestamp_str, url = match.groups()
-                    timestamp = time.mktime(time.strptime(timestamp_str.split(',')[0], '%Y-%m-%d %H:%M:%S'))
-                    main_domain = get_main_domain(url)
-                    
-                    stats['total_requests'][main_domain] += 1
-                    
-                    # Check time since last access
-                    if domain_last_access[main_domain]:
-                        delay = timestamp - domain_last_access[main_domain]
-                        stats['avg_delay'][main_domain].append(delay)
-                        
-                        if stats['min_delay'][main_domain] == 0 or delay < stats['min_delay'][main_domain]:
-                            stats['min_delay'][main_domain] = delay
-                            
-                        if delay > stats['max_delay'][main_domain]:
-                            stats['max_delay'][main_domain] = delay
-                            
-                        if delay < 0.5:  # Less than 500ms
-                            violations[main_domain].append({
-                                'url': url,
-                                'timestamp': timestamp_str,
-                                'delay': delay,
-                                'log_file': os.path.basename(log_file)
-                            })
-                    
-                    domain_last_access[main_domain] = timestamp
+    # Files are independent until their entries are merged, so parse them in parallel
+    if len(log_files) > 1:
+        with ProcessPoolExecutor() as executor:
+            results = list(executor.map(parse_log_file, log_files, [tail] * len(log_files)))
+    else:
+        results = [parse_log_file(log_file, tail) for log_file in log_files]
+    for result in results:
+        for main_domain, entries in result.items():
+            domain_entries[main_domain].extend(entries)
+    
+    # Delays are computed per domain only after every file has been read, so
+    # accesses from different files are compared in time order
+    for main_domain, entries in domain_entries.items():
+        entries.sort(key=lambda entry: entry[0])  # Stable, keeps log order within a second
+        stats['total_requests'][main_domain] = len(entries)
+        
+        (delay_sum, delay_count, min_delay, max_delay,
+         violation_count, domain_violations) = delay_stats(
+            [entry[0] for entry in entries], threshold=0.5)  # Less than 500ms
+        stats['delay_sum'][main_domain] = delay_sum
+        stats['delay_count'][main_domain] = delay_count
+        stats['min_delay'][main_domain] = min_delay
+        stats['max_delay'][main_domain] = max_delay
+        if violation_count:
+            violation_counts[main_domain] = violation_count
+        
+        for i, delay in domain_violations:
+            timestamp, timestamp_str, url, log_name = entries[i]
+            violations[main_domain].append({
+                'url': url,
+                'timestamp': timestamp_str,
+                'delay': delay,
+                'log_file': log_name
+            })
     
     # Print analysis
     print("\nPoliteness Analysis Report")
@@ -79,7 +194,8 @@ def analyze_logs(log_files):
     print("\nDomain Statistics:")
     print("-" * 80)
     for domain in sorted(stats['total_requests'].keys()):
-        avg_delay = sum(stats['avg_delay'][domain]) / len(stats['avg_delay'][domain]) if stats['avg_delay'][domain] else 0
+        delay_count = stats['delay_count'][domain]
+        avg_delay = stats['delay_sum'][domain] / delay_count if delay_count else 0
         print(f"\n{domain}:")
         print(f"  Total Requests: {stats['total_requests'][domain]}")
         print(f"  Average Delay: {avg_delay:.3f}s")
@@ -94,23 +210,27 @@ def analyze_logs(log_files):
     print("-" * 80)
     for domain, domain_violations in sorted(violations.items()):
         print(f"\n{domain}:")
-        print(f"Total violations: {len(domain_violations)}")
+        print(f"Total violations: {violation_counts[domain]}")
         print("Sample violations:")
-        for v in domain_violations[:5]:  # Show first 5 violations
+        for v in domain_violations:  # Only the first few are kept
             print(f"  {v['timestamp']} - {v['url']}")
             print(f"    Delay: {v['delay']:.3f}s (in {v['log_file']})")
 
 if __name__ == "__main__":
     import sys
+    from argparse import ArgumentParser
     
-    if len(sys.argv) < 2:
-        print("Usage: python check_politeness.py <log_file_pattern>")
-        print("Example: python check_politeness.py 'crawler*.log'")
-        sys.exit(1)
+    parser = ArgumentParser(
+        description="Check crawler logs for politeness violations.",
+        epilog="Example: python check_politeness.py 'crawler*.log'")
+    parser.add_argument("log_file_pattern", help="glob pattern of log files to analyze")
+    parser.add_argument("--tail", type=int, default=None,
+                        help="only analyze the last N lines of each log file")
+    args = parser.parse_args()
     
-    log_files = glob.glob(sys.argv[1])
+    log_files = glob.glob(args.log_file_pattern)
     if not log_files:
-        print(f"No log files found matching pattern: {sys.argv[1]}")
+        print(f"No log files found matching pattern: {args.log_file_pattern}")
         sys.exit(1)
         
-    analyze_logs(log_files) 
\ No newline at end of file
+    analyze_logs(log_files, tail=args.tail)
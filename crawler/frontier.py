@@ -1,26 +1,68 @@
 import os
-import shelve
-from threading import Thread, RLock
-from collections import defaultdict
+import sqlite3
+import heapq
+import atexit
+from threading import Thread, Lock, Condition, Event
+from collections import defaultdict, deque
+from functools import lru_cache
 import time
-from urllib.parse import urlparse
-from utils import get_logger, get_urlhash, normalize
-from scraper import is_valid
+from utils import get_logger, get_urlhash, get_netloc, normalize
+from scraper import is_valid, is_trap, is_allowed_by_robots
+
+# Commit the save file after this many writes; a background flusher also
+# commits any pending writes every SYNC_INTERVAL seconds
+SYNC_EVERY = 256
+SYNC_INTERVAL = 1  # In seconds
+
+# Most URLs inserted per executemany call in add_urls
+SQL_BATCH_SIZE = 500
+
+# Rows read per chunk when loading the save file on resume
+LOAD_CHUNK_SIZE = 10000
+
+# Number of locks shared by all domain queues; must be a power of two
+DOMAIN_LOCK_STRIPES = 64
+
+@lru_cache(maxsize=4096)
+def _main_domain_from_netloc(netloc):
+    """Keep the last three labels of a netloc, e.g. www.ics.uci.edu -> ics.uci.edu"""
+    domain_parts = netloc.rsplit('.', 3)
+    # Handle domains like ics.uci.edu, cs.uci.edu
+    if len(domain_parts) >= 3:
+        return '.'.join(domain_parts[-3:])
+    return netloc
 
 class Frontier:
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
         
-        # Thread safety
-        self._lock = RLock()
+        # Thread safety: the heap lock guards scheduling state (heap, scheduled
+        # domains, last access times), a striped domain lock guards each
+        # domain's queue and the save lock guards the sqlite connection. When
+        # nested, the heap lock is always taken before a domain lock.
+        self._heap_lock = Lock()
+        self._ready_cv = Condition(self._heap_lock)  # Notified when a domain is scheduled
+        self._domain_locks = [Lock() for _ in range(DOMAIN_LOCK_STRIPES)]
+        self._save_lock = Lock()
         
         # Track queues and timing for main domains (e.g., ics.uci.edu, cs.uci.edu)
-        self.main_domain_queues = defaultdict(list)  # URLs for each main domain
+        self.main_domain_queues = defaultdict(deque)  # URLs for each main domain
         self.main_domain_last_access = defaultdict(float)  # Last access time for each main domain
         
+        # Politeness scheduling: min-heap of (next_available_time, main_domain)
+        # holding every main domain that has URLs waiting in its queue
+        self._ready_heap = []
+        self._scheduled_domains = set()
+        
         # Global tracking
-        self.in_progress = set()
+        self._url_hashes = {}  # urlhash of every queued or in-progress URL
+        self._seen = set()  # urlhash of every URL in the save file; written under the save lock
+        
+        # Batched persistence
+        self._dirty_count = 0
+        self._completed_hashes = []  # (urlhash,) rows not yet marked completed in the save file
+        self._closed = Event()
         
         if not os.path.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
@@ -31,99 +73,249 @@ class Frontier:
             # Save file does exists, but request to start from seed.
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.config.save_file + suffix):
+                    os.remove(self.config.save_file + suffix)
             
         # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
+        self.save = sqlite3.connect(self.config.save_file, check_same_thread=False)
+        self.save.execute("PRAGMA journal_mode=WAL")
+        self.save.execute("PRAGMA synchronous=NORMAL")
+        self.save.execute("PRAGMA temp_store=MEMORY")
+        self.save.execute(
+            "CREATE TABLE IF NOT EXISTS url ("
+            "hash TEXT PRIMARY KEY, url TEXT NOT NULL, domain TEXT, "
+            "completed INTEGER NOT NULL DEFAULT 0)")
+        # Save files written before the domain column existed get it added;
+        # their rows have no domain and fall back to computing it on load
+        columns = {row[1] for row in self.save.execute("PRAGMA table_info(url)")}
+        if "domain" not in columns:
+            self.save.execute("ALTER TABLE url ADD COLUMN domain TEXT")
+        self.save.commit()
+        atexit.register(self.close)
+        Thread(target=self._flusher, name="FrontierFlusher", daemon=True).start()
         if restart:
-            for url in self.config.seed_urls:
-                self.add_url(url)
+            self.add_urls(self.config.seed_urls, checked=False)
         else:
             self._parse_save_file()
-            if not self.save:
-                for url in self.config.seed_urls:
-                    self.add_url(url)
+            if not self.save.execute("SELECT 1 FROM url LIMIT 1").fetchone():
+                self.add_urls(self.config.seed_urls, checked=False)
 
     def get_main_domain(self, url):
         """
         Extract main domain from URL
         e.g., www.ics.uci.edu -> ics.uci.edu
         """
-        parsed = urlparse(url)
-        domain_parts = parsed.netloc.split('.')
-        # Handle domains like ics.uci.edu, cs.uci.edu
-        if len(domain_parts) >= 3:
-            return '.'.join(domain_parts[-3:])
-        return parsed.netloc
-
-    def get_tbd_url(self):
-        """Get next URL respecting politeness delay at main domain level"""
-        current_time = time.time()
+        return _main_domain_from_netloc(get_netloc(url))
+
+    def _lock_for(self, main_domain):
+        """Return the striped lock guarding a main domain's queue"""
+        return self._domain_locks[hash(main_domain) & (DOMAIN_LOCK_STRIPES - 1)]
+
+    def get_tbd_url(self, timeout=0.0):
+        """
+        Get next URL respecting politeness delay at main domain level.
+        If no domain is ready, block for up to timeout seconds, waking when
+        the earliest domain cools down or a new domain is scheduled.
+        """
+        deadline = time.time() + timeout
         
-        with self._lock:
-            # Check each main domain queue
-            for main_domain, urls in self.main_domain_queues.items():
-                if not urls:
+        with self._ready_cv:
+            while True:
+                current_time = time.time()
+                if not self._ready_heap or current_time < self._ready_heap[0][0]:
+                    # Nothing is ready yet; sleep until the heap head is due
+                    remaining = deadline - current_time
+                    if remaining <= 0:
+                        return None
+                    if self._ready_heap:
+                        remaining = min(remaining, self._ready_heap[0][0] - current_time)
+                    self._ready_cv.wait(remaining)
                     continue
-                    
-                # Enforce 500ms delay for main domain and all its subdomains
-                time_since_last = current_time - self.main_domain_last_access[main_domain]
-                if time_since_last < 0.5:  # Strict 500ms politeness delay
+                
+                main_domain = heapq.heappop(self._ready_heap)[1]
+                
+                # add_url only enqueues URLs that are new to the save file, so
+                # the head of the queue is never already in progress
+                # A drained domain is unscheduled while its queue lock is held,
+                # which lets add_url check the scheduled set without the heap lock
+                with self._lock_for(main_domain):
+                    urls = self.main_domain_queues[main_domain]
+                    url = urls.popleft() if urls else None
+                    has_more = bool(urls)
+                    if not has_more:
+                        self._scheduled_domains.discard(main_domain)
+                
+                if url is None:
                     continue
-                    
-                # Get first non-in-progress URL
-                for i, url in enumerate(urls):
-                    if url not in self.in_progress:
-                        urls.pop(i)
-                        self.in_progress.add(url)
-                        # Update last access time for the main domain
-                        self.main_domain_last_access[main_domain] = current_time
-                        self.logger.info(f"Assigning URL {url} from domain {main_domain} (waited {time_since_last:.2f}s)")
-                        return url
-            
-            return None
+                
+                time_since_last = current_time - self.main_domain_last_access[main_domain]
+                # Update last access time for the main domain
+                self.main_domain_last_access[main_domain] = current_time
+                if has_more:
+                    heapq.heappush(
+                        self._ready_heap,
+                        (current_time + self.config.time_delay, main_domain))
+                self.logger.info(f"Assigning URL {url} from domain {main_domain} (waited {time_since_last:.2f}s)")
+                return url
+
+    def _schedule_domain(self, main_domain):
+        """Push a main domain onto the ready heap if it is not already there"""
+        with self._ready_cv:
+            if main_domain in self._scheduled_domains:
+                return
+            self._scheduled_domains.add(main_domain)
+            heapq.heappush(
+                self._ready_heap,
+                (self.main_domain_last_access[main_domain] + self.config.time_delay, main_domain))
+            self._ready_cv.notify()
 
     def add_url(self, url):
         """Add URL to frontier"""
-        if not url:
-            return
-            
-        url = normalize(url)
-        if not is_valid(url):
+        self.add_urls([url])
+
+    def _is_crawlable(self, url):
+        """
+        The checks scraped links pass before reaching the frontier, for URLs
+        that arrive any other way (seeds, URLs resumed from the save file)
+        """
+        return is_valid(url) and not is_trap(url) and is_allowed_by_robots(url, self.config)
+
+    def add_urls(self, urls, checked=True):
+        """
+        Add a batch of URLs to frontier, e.g. every link scraped from a page.
+        The save file and each domain queue are locked once per batch
+        instead of once per URL.
+        Scraped links have already passed is_trap and robots.txt; pass
+        checked=False for any other URLs to apply those checks here.
+        """
+        # urlhash -> (url, main_domain); the hash ignores the scheme, so
+        # http and https variants of one URL collapse here as well
+        candidates = {}
+        for url in urls:
+            if not url:
+                continue
+            url = normalize(url)
+            if not (is_valid(url) if checked else self._is_crawlable(url)):
+                continue
+            urlhash = get_urlhash(url)
+            # Lock-free prefilter; most scraped links are already known
+            if urlhash not in candidates and urlhash not in self._seen:
+                candidates[urlhash] = (url, self.get_main_domain(url))
+        if not candidates:
             return
             
-        with self._lock:
-            urlhash = get_urlhash(url)
-            if urlhash not in self.save:
-                self.save[urlhash] = (url, False)
-                self.save.sync()
-                # Add URL to its main domain queue
-                main_domain = self.get_main_domain(url)
-                self.main_domain_queues[main_domain].append(url)
+        new_urls = defaultdict(list)
+        items = list(candidates.items())
+        with self._save_lock:
+            # After close() at exit, daemon workers may still report links;
+            # they can no longer be saved, so they are dropped
+            if self._closed.is_set():
+                return
+            for start in range(0, len(items), SQL_BATCH_SIZE):
+                batch = items[start:start + SQL_BATCH_SIZE]
+                # Recheck under the lock; another worker may have added some
+                rows = [(urlhash, url, main_domain)
+                        for urlhash, (url, main_domain) in batch
+                        if urlhash not in self._seen]
+                if not rows:
+                    continue
+                self._seen.update(row[0] for row in rows)
+                self.save.executemany(
+                    "INSERT INTO url (hash, url, domain, completed) VALUES (?, ?, ?, 0)",
+                    rows)
+                for urlhash, url, main_domain in rows:
+                    new_urls[main_domain].append(url)
+                    self._url_hashes[url] = urlhash
+                self._maybe_sync(len(rows))
+        
+        # Add URLs to their main domain queues
+        for main_domain, domain_urls in new_urls.items():
+            with self._lock_for(main_domain):
+                self.main_domain_queues[main_domain].extend(domain_urls)
+                # Already on the heap: it cannot be unscheduled before it sees these URLs
+                needs_schedule = main_domain not in self._scheduled_domains
+            if needs_schedule:
+                self._schedule_domain(main_domain)
 
     def mark_url_complete(self, url):
         """Mark URL as completed"""
         if not url:
             return
-            
-        with self._lock:
-            self.in_progress.discard(url)
-            urlhash = get_urlhash(url)
-            if urlhash in self.save:
-                self.save[urlhash] = (url, True)
-                self.save.sync()
+
+        urlhash = self._url_hashes.pop(url, None) or get_urlhash(url)
+        with self._save_lock:
+            if self._closed.is_set():  # Save file already closed at exit
+                return
+            # Buffered and applied in one batch on the next commit
+            self._completed_hashes.append((urlhash,))
+            self._maybe_sync()
+
+    def _maybe_sync(self, writes=1):
+        """
+        Commit the save file once enough writes have accumulated.
+        Caller must hold the save lock.
+        """
+        self._dirty_count += writes
+        if self._dirty_count >= SYNC_EVERY:
+            self._commit()
+
+    def _commit(self):
+        """Commit pending writes; caller must hold the save lock"""
+        if self._completed_hashes:
+            self.save.executemany(
+                "UPDATE url SET completed = 1 WHERE hash = ?", self._completed_hashes)
+            self._completed_hashes = []
+        if self._dirty_count:
+            self.save.commit()
+        self._dirty_count = 0
+
+    def _sync(self):
+        """Commit pending writes to the save file"""
+        with self._save_lock:
+            if not self._closed.is_set():
+                self._commit()
+
+    def _flusher(self):
+        """Background thread committing pending writes every SYNC_INTERVAL seconds"""
+        while not self._closed.wait(SYNC_INTERVAL):
+            self._sync()
+
+    def close(self):
+        """Commit pending writes and close the save file; runs at exit"""
+        with self._save_lock:
+            if self._closed.is_set():
+                return
+            self._commit()
+            self._closed.set()
+            self.save.close()
 
     def _parse_save_file(self):
-        """Load URLs from save file"""
-        with self._lock:
-            total_count = len(self.save)
-            tbd_count = 0
-            for url, completed in self.save.values():
-                if not completed and is_valid(url):
-                    # Add to appropriate main domain queue
-                    main_domain = self.get_main_domain(url)
-                    self.main_domain_queues[main_domain].append(url)
-                    tbd_count+=1
-            self.logger.info(f"Found {tbd_count} urls to be downloaded from {total_count} total urls discovered.")
-    def __del__(self):
-        self.save.close()
+        """
+        Load URLs from save file, streaming it in chunks of LOAD_CHUNK_SIZE
+        rows so the save lock is only held while a chunk is fetched
+        """
+        total_count = 0
+        tbd_count = 0
+        with self._save_lock:
+            cursor = self.save.execute("SELECT hash, url, domain, completed FROM url")
+        while True:
+            with self._save_lock:
+                rows = cursor.fetchmany(LOAD_CHUNK_SIZE)
+            if not rows:
+                break
+            total_count += len(rows)
+            
+            # Group the chunk's pending URLs without any locking, then publish each domain once
+            loaded = defaultdict(list)
+            for urlhash, url, main_domain, completed in rows:
+                self._seen.add(urlhash)
+                if not completed and self._is_crawlable(url):
+                    loaded[main_domain or self.get_main_domain(url)].append(url)
+                    self._url_hashes[url] = urlhash
+            for main_domain, urls in loaded.items():
+                with self._lock_for(main_domain):
+                    self.main_domain_queues[main_domain].extend(urls)
+                self._schedule_domain(main_domain)
+                tbd_count += len(urls)
+        self.logger.info(f"Found {tbd_count} urls to be downloaded from {total_count} total urls discovered.")
@@ -6,6 +6,23 @@ from utils import get_logger
 import scraper
 import time
 
+# Longest a worker blocks in get_tbd_url before checking the frontier again
+IDLE_TIMEOUT = 5  # In seconds
+
+# First sleep after get_tbd_url comes back empty; doubles up to config.time_delay
+IDLE_BACKOFF = 0.01  # In seconds
+
+# basic check for requests in scraper; the source is the same for every worker
+_SCRAPER_SOURCE = getsource(scraper)
+assert {_SCRAPER_SOURCE.find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests in scraper.py"
+assert {_SCRAPER_SOURCE.find(req) for req in {"from urllib.request import", "import urllib.request"}} == {-1}, "Do not use urllib.request in scraper.py"
+
+# URLs are filtered when they enter the frontier, not when they are handed
+# out: for scraped links scraper.scraper applies is_valid and is_trap and
+# run() applies robots.txt, while seeds and URLs resumed from the save file
+# get is_valid, is_trap and robots.txt in the frontier itself. URLs handed
+# out by get_tbd_url are therefore downloaded without being checked again.
+
 
 class Worker(Thread):
     def __init__(self, worker_id, config, frontier):
@@ -13,25 +30,22 @@ class Worker(Thread):
         self.config = config
         self.frontier = frontier
         self.logger = get_logger(f"Worker-{worker_id}", f"Worker")
-        # basic check for requests in scraper
-        assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests in scraper.py"
-        assert {getsource(scraper).find(req) for req in {"from urllib.request import", "import urllib.request"}} == {-1}, "Do not use urllib.request in scraper.py"
         super().__init__(daemon=True)
         
     def run(self):
         """Main worker loop"""
+        backoff = IDLE_BACKOFF
         while True:
             try:
-                # Get next URL
-                url = self.frontier.get_tbd_url()
+                # Get next URL, waiting until a domain is ready or new URLs arrive
+                url = self.frontier.get_tbd_url(timeout=IDLE_TIMEOUT)
                 if not url:
-                    time.sleep(0.1)  # Short sleep if no URLs
-                    continue
-                
-                if not scraper.is_valid(url) or scraper.is_trap(url) or not scraper.is_allowed_by_robots(url, self.config):
-                    self.logger.info(f"Invalid URL or trap URL or not allowed by robots.txt: {url}")
-                    self.frontier.mark_url_complete(url)
+                    # Frontiers that do not block return at once; back off so
+                    # an empty frontier does not spin
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, self.config.time_delay)
                     continue
+                backoff = IDLE_BACKOFF
                 
                 # Download page
                 resp = download(url, self.config, self.logger)
@@ -40,17 +54,16 @@ class Worker(Thread):
                     f"Downloaded {url}, status <{resp.status}>, "
                     f"using cache {self.config.cache_server}.")
                 
-                # Extract and add new URLs
+                # Extract and add new URLs; scraper.scraper only returns
+                # links that pass is_valid and is_trap
                 new_urls = scraper.scraper(url, resp)
                 
-                # Filter URLs by robots.txt and valid urls and traps
-                filtered_urls = []
-                for new_url in new_urls:
-                    if scraper.is_allowed_by_robots(new_url, self.config) and not scraper.is_trap(new_url) and scraper.is_valid(new_url):
-                        filtered_urls.append(new_url)
+                # Filter URLs by robots.txt
+                filtered_urls = [
+                    new_url for new_url in new_urls
+                    if scraper.is_allowed_by_robots(new_url, self.config)]
                 
-                for new_url in filtered_urls:
-                    self.frontier.add_url(new_url)
+                self.frontier.add_urls(filtered_urls)
                     
                 # Mark current URL complete
                 self.frontier.mark_url_complete(url)
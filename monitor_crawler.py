@@ -1,3 +1,5 @@
+import os
+import selectors
 import subprocess
 import time
 
@@ -5,28 +7,47 @@ def run_crawler():
     print("🔄 Starting the crawler...")
 
     # Run launch.py and capture output
-    process = subprocess.Popen(["python3", "launch.py"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    process = subprocess.Popen(["python3", "launch.py"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # Wait on both pipes with select so the timeout below is enforced even when
+    # the crawler prints nothing, and stderr (where logging goes) never fills up.
+    # Only stdout counts as progress: workers keep logging errors to stderr
+    # while the cache server is unreachable.
+    selector = selectors.DefaultSelector()
+    selector.register(process.stdout, selectors.EVENT_READ, b"")
+    selector.register(process.stderr, selectors.EVENT_READ, b"")
 
     last_output_time = time.time()  # Record the last time output was received
     timeout = 180  # Timeout in seconds; if no output for 180 seconds, assume the server is down
 
     while True:
-        output = process.stdout.readline()  # Read a line of output
-        if output:
-            print("🐍 Crawler output:", output.strip())  # Print output in real-time
-            last_output_time = time.time()  # Update last output time
+        for key, _ in selector.select(timeout=1):
+            chunk = os.read(key.fd, 65536)
+            if not chunk:
+                if key.data:
+                    print("🐍 Crawler output:", key.data.decode(errors="replace").strip())
+                selector.unregister(key.fileobj)  # Pipe closed
+                continue
+            *lines, partial = (key.data + chunk).split(b"\n")
+            selector.modify(key.fileobj, selectors.EVENT_READ, partial)
+            for line in lines:
+                print("🐍 Crawler output:", line.decode(errors="replace").strip())  # Print output in real-time
+            if key.fileobj is process.stdout:
+                last_output_time = time.time()  # Update last output time
         
         # Check if timeout has been exceeded (server may be down)
         if time.time() - last_output_time > timeout:
             print("⚠️ Server might be down, waiting for recovery...")
             process.terminate()  # Terminate the stuck process
             process.wait()  # Ensure the process has fully exited
+            selector.close()
             time.sleep(60)  # Wait for 60 seconds before retrying
             return True  # Retry the process
 
         # Check if the crawler has exited on its own
         if process.poll() is not None:
             print("⏳ Crawler has exited, waiting for the server to start...")
+            selector.close()
             time.sleep(120)  # Wait for 120 seconds before retrying
             return True  # Retry the process
 
@@ -1,12 +1,22 @@
 from configparser import ConfigParser
 import re
 from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
-from collections import defaultdict
+import lxml.html
+from lxml import etree
+from collections import defaultdict, Counter, OrderedDict, deque
+from functools import lru_cache
 import urllib.robotparser
 from threading import Lock
 import time
 import os
+import heapq
+from operator import itemgetter
+import posixpath
+import multiprocessing
+import numpy as np
+from xxhash import xxh3_64_intdigest
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from utils.config import Config
 from utils.download import download
@@ -21,30 +31,173 @@ last_save_time = time.time()
 SAVE_INTERVAL = 30  # Save every 30 seconds
 
 # Global statistics tracking
-word_frequencies = defaultdict(int)  # Track word frequencies
-page_word_counts = {}  # Track page lengths
-unique_page_count = set()  # Track unique URLs
+word_frequencies = Counter()  # Track word frequencies
+longest_page = ('', 0)  # (url, word count) of the longest page so far
+# Kept up to date by process_content so get_analytics does not rescan every page
+unique_page_urls = set()  # 64-bit hashes of crawled URLs with fragments removed
+ics_subdomain_pages = defaultdict(int)  # 'scheme://netloc' of ics.uci.edu hosts -> unique pages
+last_saved_longest_page = None  # Longest page last written to longest_page.txt
 
 # Trap detection
-url_patterns = defaultdict(int)  # Track URL patterns
-content_fingerprints = []  # Store document fingerprints
-robots_cache = {}  # Cache for robots.txt parsers
-visited_urls = set()  # Track already visited URLs
-
-# Load stopwords
-STOPWORDS = set()
+# Recent document fingerprints, kept in a ring buffer so they can be compared in bulk
+MAX_FINGERPRINTS = 1000  # Limit memory usage
+fingerprint_lock = Lock()
+fingerprint_values = np.zeros(MAX_FINGERPRINTS, dtype=np.uint64)  # SimHash value per slot
+fingerprint_domains = np.full(MAX_FINGERPRINTS, -1, dtype=np.int32)  # Domain id per slot, -1 if empty
+fingerprint_urls = [None] * MAX_FINGERPRINTS  # URL per slot
+fingerprint_next = 0  # Slot the next fingerprint goes into; the oldest once the buffer is full
+domain_ids = {}  # Small int id per netloc, for comparing domains in bulk
+domain_fingerprint_counts = Counter()  # Domain id -> fingerprints stored for it
+# Hashes of the exact body and text of recent pages, also guarded by fingerprint_lock
+MAX_EXACT_HASHES = 4096  # Two per page
+exact_hash_order = deque(maxlen=MAX_EXACT_HASHES)  # Oldest first
+exact_hashes = set()  # Same hashes as exact_hash_order, for lookups
+SIMILARITY_THRESHOLD = 3  # In bits out of 64, the usual near-duplicate cutoff for SimHash
+# Cache for robots.txt parsers: host -> (expiry time, parser), least recently used first
+ROBOTS_CACHE_SIZE = 1024
+ROBOTS_TTL = 6 * 3600  # In seconds
+ROBOTS_ERROR_TTL = 10 * 60  # In seconds, for hosts whose robots.txt failed to load
+ROBOTS_MAX_SIZE = 500 * 1024  # In bytes; like Google, anything past this is ignored
+robots_cache = OrderedDict()
+robots_lock = Lock()
+visited_urls = set()  # 64-bit hashes of already visited URLs, far smaller than the strings
+visited_lock = Lock()
+
+# Shared process pool for HTML parsing, created on first use
+parse_pool = None
+parse_pool_lock = Lock()
+
+# Precompiled patterns for SimHash, process_content, is_trap and is_valid
+NON_WORD_RE = re.compile(r'[^\w\s]')
+# Same replacement as NON_WORD_RE.sub(' ', ...) for ASCII text
+ASCII_NON_WORD_TABLE = str.maketrans({chr(c): ' ' for c in range(128) if NON_WORD_RE.match(chr(c))})
+WORD_TOKEN_RE = re.compile(r'(?<!\S)[a-z0-9]+(?!\S)')  # On lowercased ASCII text
+DATE_PATH_RE = re.compile(r'/\d{4}/\d{2}/')  # Also covers /yyyy/mm/dd/
+WIKI_ACTION_RE = re.compile(r'\?do=(index|revisions|diff|backlink)')
+TIMESTAMP_QUERY_RE = re.compile(r'from=\d{4}-\d{2}-\d{2}|precision=(second|minute|hour)')
+CALENDAR_PATH_RE = re.compile(r'/calendar/|/events?/|/archive/')
+
+# Paths is_trap never flags; a tuple so str.startswith can test them all at once
+TRAP_EXEMPT_PATH_PREFIXES = (
+    '/seminars/', '/people/', '/faculty/', '/staff/',
+    '/research/', '/grad/', '/phd/', '/courses/',
+    '/news/', '/contact/', '/about/', '/explore/',
+    '/seminar-series/', '/chairs-message/', '/what-is-statistics/',
+    '/tutoring-resources/', '/m-s-ph-d-in-statistics/',
+    '/grad-student-directory/', '/minor-in-statistics/'
+)
+ROOT_PATHS = frozenset({'/', '', '/index.html', '/index.htm'})
+
+# Absolute http(s) or root-relative links that urljoin returns unchanged
+# (apart from adding the scheme and host to root-relative ones): a plain host,
+# no whitespace, no empty, '.' or '..' segments, no ';' params and no empty query
+SIMPLE_LINK_RE = re.compile(
+    r'(?:https?://[A-Za-z0-9.:-]+)?'
+    r'/(?:[^/?#;\s.][^/?#;\s]*(?:/[^/?#;\s.][^/?#;\s]*)*/?)?'
+    r'(?:\?[^#\s]+)?(?:#\S*)?\Z')
+# Path fragments is_similar_content never checks, anywhere in the path
+SIMILARITY_EXEMPT_PATH_RE = re.compile('|'.join(map(re.escape, [
+    '/explore/', '/about/', '/faculty/', '/staff/',
+    '/research/', '/grad/', '/phd/', '/courses/',
+    '/people/', '/contact/', '/news/'
+])))
+
+# Domains is_valid allows, with or without a subdomain
+ALLOWED_DOMAINS = frozenset({
+    'ics.uci.edu',
+    'cs.uci.edu',
+    'informatics.uci.edu',
+    'stat.uci.edu'
+})
+ALLOWED_DOMAIN_SUFFIXES = tuple('.' + domain for domain in ALLOWED_DOMAINS)
+
+# File extensions is_valid rejects, matched against the end of the URL path
+INVALID_EXTENSIONS = frozenset({
+    # Documents
+    'pdf', 'doc', 'docx', 'ppt', 'pptx', 'ppsx', 'xls', 'xlsx', 'csv',
+    'txt', 'rtf', 'odc', 'odt', 'ods', 'odp', 'tex', 'ps', 'eps', 'cls', 'bib',
+    # Images
+    'jpg', 'jpeg', 'png', 'gif', 'bmp', 'tiff', 'ico', 'svg', 'webp', 'heic', 'heif', 'hevc', 'avif', 'img',
+    # Audio/Video
+    'mp3', 'mp4', 'wav', 'avi', 'mov', 'wmv', 'flv', 'mkv', 'webm',
+    'mpg', 'mpeg', 'm4v', '3gp', 'ogg', 'ogv',
+    # Archives
+    'zip', 'rar', 'gz', 'tar', '7z', 'bz2', 'xz', 'deb', 'rpm', 'msi', 'apk',
+    # Web assets
+    'css', 'js', 'json', 'xml', 'rss', 'atom', 'php', 'war', 'tgz',
+    # Other
+    'exe', 'dll', 'so', 'dmg', 'iso', 'bin', 'swf', 'woff', 'woff2', 'eot', 'ttf', 'fig', 'ss',
+    'rkt', 'py', 'data', 'java', 'hqx', 'lif', 'asp', 'lca', 'pq', 'hash', 'shar', 'cp', 'ma', 'tif', 'db',
+    'cpp', 'diff', 'dtd', 'emx', 'ff', 'grm', 'in', 'io', 'lsp', 'mat', 'nb', 'pov', 'pps', 'rle', 'rls', 'sas',
+    'scm', 'sh', 'sql', 'uai',
+})
+
+# Path fragments is_valid rejects: resource directories, then problematic paths
+RESOURCE_PATHS = [
+    '/images/', '/img/', '/media/',
+    '/video/', '/audio/', '/download/',
+    '/css/', '/js/', '/assets/', '/fonts/',
+    '/static/', '/uploads/', '/files/', '/bibs/', '/publications/', '/docs/', '/papers/', '/pdfs/'
+]
+BLOCKED_PATHS = [
+    '/login', '/logout', '/search', '/print/',
+    '/feed', '/rss', '/atom', '/api/', '/ajax/',
+    '/cgi-bin/', '/wp-content/',
+    '/admin/', '/backup/', '/raw/',
+]
+# Both lists and the calendar traps in one pattern, so a path is scanned
+# once; every alternative starts with '/', which re factors out
+REJECTED_PATH_RE = re.compile('|'.join(
+    [re.escape(p) for p in RESOURCE_PATHS]
+    + [CALENDAR_PATH_RE.pattern]
+    + [re.escape(p) for p in BLOCKED_PATHS]))
+
+# Load stopwords once at import, from next to this file so the working directory does not matter
+STOPWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stopwords.txt')
+STOPWORDS = frozenset()
 try:
-    with open('stopwords.txt', 'r') as f:
-        STOPWORDS = set(word.strip().lower() for word in f)
+    with open(STOPWORDS_PATH, 'r') as f:
+        STOPWORDS = frozenset(word.strip().lower() for word in f)
 except Exception as e:
     print(f"Warning: Could not load stopwords.txt: {e}")
 
+# Words per block when building the SimHash vector; caps the bit matrix at 2MB
+SIMHASH_CHUNK_SIZE = 4096
+
+# Number of set bits in a non-negative int; int.bit_count is Python 3.10+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:
+    def popcount(x):
+        return bin(x).count('1')
+
+# Set bits of every element of a uint64 array; np.bitwise_count is NumPy 2.0+
+if hasattr(np, 'bitwise_count'):
+    def popcount_array(values):
+        return np.bitwise_count(values)
+else:
+    POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount_array(values):
+        # Count the set bits of each byte through a lookup table
+        return POPCOUNT_TABLE[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+@lru_cache(maxsize=8192)
+def parse_url(url):
+    """
+    urlparse with a cache. A link goes through is_valid, is_trap and the page
+    checks, so each is parsed once instead of several times. ParseResult is
+    immutable, so sharing it is safe.
+    """
+    return urlparse(url)
+
 class SimHash:
     """
     Implementation of SimHash algorithm for near-duplicate detection
     """
     def __init__(self, text, hash_bits=64):
-        self.hash_bits = hash_bits
+        self.hash_bits = hash_bits  # At most 64, the width of a word hash
+        self._hash_mask = (1 << hash_bits) - 1
         self.hash_value = self._generate_hash(text)
 
     def _preprocess_text(self, text):
@@ -53,26 +206,23 @@ class SimHash:
         """
         # Normalize text
         text = text.lower()
-        # Remove special characters and extra spaces
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = ' '.join(text.split())
+        # Remove special characters; split() drops the extra spaces. ASCII
+        # text, the common case, goes through a translate table instead of
+        # the regex, which is many times faster
+        if text.isascii():
+            text = text.translate(ASCII_NON_WORD_TABLE)
+        else:
+            text = NON_WORD_RE.sub(' ', text)
         
         # Get word frequencies
         words = text.split()
-        word_freq = defaultdict(int)
-        for word in words:
-            if len(word) > 2:  # Skip very short words
-                word_freq[word] += 1
-        return word_freq
+        return Counter(word for word in words if len(word) > 2)  # Skip very short words
 
     def _hash_function(self, word):
         """
-        Generate a b-bit hash value for a word using basic hash function
+        Generate a b-bit hash value for a word; xxh3 gives well-mixed bits
         """
-        hash_val = 0
-        for char in word.encode('utf-8'):
-            hash_val = (hash_val * 31 + char) & ((1 << self.hash_bits) - 1)
-        return hash_val
+        return xxh3_64_intdigest(word.encode('utf-8')) & self._hash_mask
 
     def _generate_hash(self, text):
         """
@@ -81,40 +231,33 @@ class SimHash:
         # Step 1: Get features (words) with weights (frequencies)
         features = self._preprocess_text(text)
         
-        # Step 3: Initialize b-dimensional vector V
-        v = [0] * self.hash_bits
+        if not features:
+            return 0
+        words = list(features)
         
-        # Process each word
-        for word, freq in features.items():
-            # Step 2: Generate hash for word
-            hash_val = self._hash_function(word)
-            
-            # Step 3: Update vector V
-            for i in range(self.hash_bits):
-                bitmask = 1 << i
-                if hash_val & bitmask:
-                    v[i] += freq  # Add weight if bit is 1
-                else:
-                    v[i] -= freq  # Subtract weight if bit is 0
+        # Step 2: Generate hash for every word
+        hashes = np.fromiter((self._hash_function(word) for word in words),
+                             dtype=np.uint64, count=len(words))
+        weights = np.fromiter(features.values(), dtype=np.int64, count=len(words))
         
-        # Step 4: Generate final fingerprint
-        fingerprint = 0
-        for i in range(self.hash_bits):
-            if v[i] > 0:
-                fingerprint |= 1 << i
+        # Step 3: Build b-dimensional vector V: bit i of every hash as a
+        # (words, bits) matrix of +1/-1, weighted by word frequency. Words go
+        # in chunks so the matrix stays small on very long pages.
+        shifts = np.arange(self.hash_bits, dtype=np.uint64)
+        v = np.zeros(self.hash_bits, dtype=np.int64)
+        for start in range(0, len(words), SIMHASH_CHUNK_SIZE):
+            chunk = slice(start, start + SIMHASH_CHUNK_SIZE)
+            bits = (hashes[chunk, None] >> shifts) & np.uint64(1)
+            v += weights[chunk] @ (2 * bits.astype(np.int64) - 1)
         
-        return fingerprint
+        # Step 4: Generate final fingerprint, bit i set where V[i] > 0
+        return sum(1 << int(i) for i in np.flatnonzero(v > 0))
 
     def distance(self, other):
         """
         Calculate Hamming distance between two SimHash values
         """
-        x = self.hash_value ^ other.hash_value
-        diff_bits = 0
-        while x:
-            diff_bits += 1
-            x &= (x - 1)  # Clear the least significant bit
-        return diff_bits
+        return popcount(self.hash_value ^ other.hash_value)
 
 
 
@@ -128,17 +271,28 @@ def scraper(url, resp):
         List of valid URLs found on the page
     """
     try:
-        clean_url = url.split('#')[0]
-        if clean_url in visited_urls:
+        if not mark_visited(url):
             return []
-        visited_urls.add(clean_url)
         links = extract_next_links(url, resp)
-        return [link for link in links if is_valid(link) and not is_trap(link)] 
+        return filter_urls(links)
         
     except Exception as e:
         print(f"Error processing {url}: {str(e)}")
         return []
 
+def mark_visited(url):
+    """
+    Records url (ignoring its fragment) as visited. Returns False if it
+    already was, so two workers never both scrape the same page.
+    """
+    url_key = xxh3_64_intdigest(url.partition('#')[0].encode('utf-8'))
+    # Own lock, held only for the set lookup, so it never waits on stats_lock
+    with visited_lock:
+        if url_key in visited_urls:
+            return False
+        visited_urls.add(url_key)
+    return True
+
 def extract_next_links(url, resp):
     """
     Processes page content and extracts links.
@@ -151,28 +305,34 @@ def extract_next_links(url, resp):
     if resp.status not in (200, 301, 302, 303, 307, 308):
         return []
     
+    headers = resp.raw_response.headers
     # Handle redirects
     if resp.status in (301, 302, 303, 307, 308):
-        if resp.raw_response.headers['Location']:
-            return [resp.raw_response.headers['Location']]
+        location = headers.get('Location')
+        if location:
+            return [location]
         else:
             return []
     try:
-        # Parse with BeautifulSoup for better HTML handling
-        soup = BeautifulSoup(resp.raw_response.content, 'html.parser')
-        
-        # Check content size
-        content_size = len(resp.raw_response.content)
+        # Cheap checks first, so skipped responses are never parsed
+        content = resp.raw_response.content
+        content_size = len(content)
         if content_size > 5 * 1024 * 1024:  # Skip files larger than 5MB
             print(f"Skipping large file: {url} ({content_size} bytes)")
             return []
         
-        # Remove script and style elements
-        for element in soup(['script', 'style', 'meta', 'link']):
-            element.decompose()
-            
-        # Extract text content
-        text = soup.get_text()
+        # Skip responses the server says are not HTML
+        content_type = headers.get('Content-Type', '')
+        if content_type and 'html' not in content_type.lower():
+            print(f"Skipping non-HTML content: {url} ({content_type})")
+            return []
+        
+        # Byte-identical copies of a recent page need no parsing at all
+        if is_duplicate_response(url, content):
+            return []
+        
+        # Parsing is CPU bound, so it runs in a worker process
+        text, links = parse_in_pool(url, content)
         
         # Skip pages with too little content
         if len(text.split()) < 50:  # Skip pages with fewer than 50 words
@@ -187,23 +347,6 @@ def extract_next_links(url, resp):
         if is_valid(url):
             # Process page content for analytics
             process_content(url, text)
-            
-        # Extract links
-        links = []
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href'].strip()
-            if href and not href.startswith(('javascript:', 'mailto:', 'tel:')):
-                try:
-                    # Convert relative URLs to absolute
-                    absolute_url = urljoin(url, href)
-                    # Remove fragments and query parameters
-                    clean_url = absolute_url.split('#')[0]
-                    # Ensure URL is ASCII-only
-                    clean_url = clean_url.encode('ascii', errors='ignore').decode()
-                    if clean_url:
-                        links.append(clean_url)
-                except:
-                    continue
         
         return links
         
@@ -211,17 +354,115 @@ def extract_next_links(url, resp):
         print(f"Error processing {url}: {str(e)}")
         return []
 
+def parse_page(url, content):
+    """
+    Parses raw HTML into its visible text and the absolute links it contains.
+    Touches no module state, so it is safe to run in another process.
+    Returns (text, links).
+    """
+    # Parse with lxml directly; building a BeautifulSoup tree on top of it
+    # cost several times the parse itself
+    try:
+        try:
+            root = lxml.html.document_fromstring(decode_page(content))
+        except ValueError:
+            # An XML encoding declaration is only accepted on bytes input
+            root = lxml.html.document_fromstring(content)
+    except etree.ParserError:  # Empty document
+        return '', []
+    
+    # Remove script and style elements, keeping the text that follows them
+    etree.strip_elements(root, 'script', 'style', 'meta', 'link', with_tail=False)
+        
+    # Extract text content
+    text = ''.join(root.itertext())
+    
+    # Extract links
+    links = []
+    parsed = parse_url(url)
+    origin = f"{parsed.scheme}://{parsed.netloc}"
+    for href in root.xpath('//a/@href'):
+        href = href.strip()
+        if href and not href.startswith(('javascript:', 'mailto:', 'tel:')):
+            try:
+                # Convert relative URLs to absolute; most links are absolute or
+                # root-relative, which need no urljoin
+                if SIMPLE_LINK_RE.match(href):
+                    absolute_url = origin + href if href[0] == '/' else href
+                else:
+                    absolute_url = urljoin(url, href)
+                # Remove fragments and query parameters
+                clean_url = absolute_url.partition('#')[0]
+                # Ensure URL is ASCII-only
+                clean_url = clean_url.encode('ascii', errors='ignore').decode()
+                if clean_url:
+                    links.append(clean_url)
+            except:
+                continue
+    
+    return text, links
+
+def decode_page(content):
+    """
+    Returns the page as text when it is valid UTF-8, else the raw bytes.
+    Given bytes without a declared charset, lxml assumes Latin-1, which
+    garbles UTF-8 pages; undecodable pages are left to lxml's own detection.
+    """
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return content
+
+def get_parse_pool():
+    """
+    Returns the process pool shared by all workers for parse_page, creating
+    it on first use. Processes are spawned rather than forked because the
+    crawler is already multi-threaded by then.
+    """
+    global parse_pool
+    with parse_pool_lock:
+        if parse_pool is None:
+            parse_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+        return parse_pool
+
+def parse_in_pool(url, content):
+    """
+    Runs parse_page in the shared process pool, so worker threads do not
+    serialize on the GIL while parsing. Falls back to parsing in this thread
+    if the pool has broken.
+    """
+    try:
+        return get_parse_pool().submit(parse_page, url, content).result()
+    except BrokenProcessPool as e:
+        print(f"Parse pool unavailable, parsing {url} in-thread: {e}")
+        return parse_page(url, content)
+
 def save_stats_if_needed():
     """
-    Saves statistics to file if enough time has passed since last save
+    Saves statistics to file if enough time has passed since last save.
+    Only a snapshot is taken under stats_lock; the report is formatted and
+    written after releasing it.
     """
-    global last_save_time
+    global last_save_time, last_saved_longest_page
     current_time = time.time()
     
-    if current_time - last_save_time >= SAVE_INTERVAL:
+    if current_time - last_save_time < SAVE_INTERVAL:
+        return
+    with stats_lock:
+        # Another worker may have saved while this one waited for the lock
+        if current_time - last_save_time < SAVE_INTERVAL:
+            return
+        last_save_time = current_time
+        # get_analytics returns fresh lists and dicts, safe to use after the lock
         stats = get_analytics()
-        with open('crawler_analytics.txt', 'w') as f:
-            f.write(f"""Web Crawler Analytics Report
+        urls_found = total_urls_found
+        urls_crawled = total_urls_crawled
+        domains_crawled = len(urls_per_domain)
+        # Log the longest page only when it changed since the last save
+        longest_page_changed = stats['longest_page'] != last_saved_longest_page
+        last_saved_longest_page = stats['longest_page']
+    
+    report = f"""Web Crawler Analytics Report
 Time: {time.strftime('%Y-%m-%d %H:%M:%S')}
 
 1. Unique Pages: {stats['unique_pages']}
@@ -241,16 +482,19 @@ Word Count: {stats['longest_page'][1]} words
 {format_subdomains(stats['subdomains'])}
 
 Additional Statistics:
-- Total URLs Found: {total_urls_found}
-- Total URLs Crawled: {total_urls_crawled}
-- Domains Crawled: {len(urls_per_domain)}
-""")
-            
+- Total URLs Found: {urls_found}
+- Total URLs Crawled: {urls_crawled}
+- Domains Crawled: {domains_crawled}
+"""
+    # Write to a temporary file and rename it, so the report is never seen half written
+    tmp_path = 'crawler_analytics.txt.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(report)
+    os.replace(tmp_path, 'crawler_analytics.txt')
+    if longest_page_changed:
         with open('longest_page.txt', 'a') as f:
             f.write(f"Longest Page: {stats['longest_page'][0]} ({stats['longest_page'][1]} words)\n")
 
-        last_save_time = current_time
-
 def format_word_frequencies(word_freq_list):
     """
     Format word frequencies for output, ensuring ASCII-only content
@@ -273,7 +517,7 @@ def process_content(url, text):
     Analyzes page content for statistics tracking.
     Ensures proper text encoding and filtering.
     """
-    global total_urls_crawled
+    global total_urls_crawled, longest_page
     print("Processing Content: " + url)
     
     try:
@@ -281,199 +525,253 @@ def process_content(url, text):
         if isinstance(text, bytes):
             text = text.decode('utf-8', errors='ignore')
         
-        # Remove non-ASCII characters and normalize spaces
-        text = ''.join(char for char in text if ord(char) < 128)
-        text = ' '.join(text.split())
+        # Remove non-ASCII characters
+        text = text.encode('ascii', errors='ignore').decode('ascii')
         
-        # Process all words for page length (including stopwords)
-        all_words = [word.lower() for word in text.split() 
-                    if word.isascii() and word.isalnum()]
+        # Process all words for page length (including stopwords): every
+        # whitespace-separated token made only of letters and digits
+        all_words = WORD_TOKEN_RE.findall(text.lower())
+        
+        # Count words for frequency (excluding stopwords) before taking the lock;
+        # the words are already lowercase, so STOPWORDS is checked directly
+        page_frequencies = Counter(word for word in all_words
+                                   if len(word) > 2 and word not in STOPWORDS)
+        
+        parsed = parse_url(url)
+        page_key = xxh3_64_intdigest(url.partition('#')[0].encode('utf-8'))
+        # ics.uci.edu itself or one of its subdomains; a substring test
+        # would also match informatics.uci.edu
+        host = parsed.hostname or ''
+        is_ics_page = host == 'ics.uci.edu' or host.endswith('.ics.uci.edu')
         
         # Track total page length (including stopwords)
         with stats_lock:
-            page_word_counts[url] = len(all_words)
-            
-            # Process words for frequency (excluding stopwords)
-            content_words = [word for word in all_words 
-                           if len(word) > 2 and not is_stopword(word)]
+            if len(all_words) > longest_page[1]:
+                longest_page = (url, len(all_words))
             
             # Update word frequencies
-            for word in content_words:
-                word_frequencies[word] += 1
+            word_frequencies.update(page_frequencies)
             
-            # Track unique URLs
-            unique_page_count.add(url)
             total_urls_crawled += 1
             
             # Update domain statistics
-            parsed = urlparse(url)
             urls_per_domain[parsed.netloc] += 1
             
-            save_stats_if_needed()
+            # Count unique pages (ignoring fragments) per ics.uci.edu subdomain
+            if page_key not in unique_page_urls:
+                unique_page_urls.add(page_key)
+                if is_ics_page:
+                    # Construct base URL with scheme
+                    ics_subdomain_pages[f"{parsed.scheme}://{parsed.netloc}"] += 1
+        
+        # Outside the lock, so other workers keep counting while the report is written
+        save_stats_if_needed()
             
     except Exception as e:
         print(f"Error processing content for {url}: {e}")
 
-def get_analytics():
+def get_analytics(top_words=50):
     """
-    Get current analytics data
+    Get current analytics data; most_common_words holds the top_words
+    most frequent words, most frequent first
     """
-    # Get unique pages (ignoring fragments)
-    unique_urls = set()
-    for url in unique_page_count:
-        base_url = url.split('#')[0]  # Remove fragments
-        unique_urls.add(base_url)
-    
-    # Find longest page
-    longest_page = ('', 0)
-    for url, count in page_word_counts.items():
-        if count > longest_page[1]:
-            longest_page = (url, count)
-    
-    # Get most common words (excluding stopwords)
-    word_list = [(word, count) for word, count in word_frequencies.items()]
-    word_list.sort(key=lambda x: x[1], reverse=True)
-    
-    # Get subdomains for ics.uci.edu with full URLs
-    ics_subdomains = defaultdict(int)
-    for url in unique_urls:
-        parsed = urlparse(url)
-        if 'ics.uci.edu' in parsed.netloc:
-            # Construct base URL with scheme
-            subdomain_url = f"{parsed.scheme}://{parsed.netloc}"
-            ics_subdomains[subdomain_url] += 1
+    # Get most common words (excluding stopwords); ties keep first-seen order
+    word_list = heapq.nlargest(top_words, word_frequencies.items(), key=itemgetter(1))
     
+    # Unique pages, the longest page and subdomain counts are kept up to date by process_content
     return {
-        'unique_pages': len(unique_urls),
+        'unique_pages': len(unique_page_urls),
         'longest_page': longest_page,
         'most_common_words': word_list,
-        'subdomains': dict(sorted(ics_subdomains.items()))  # Sort alphabetically
+        'subdomains': dict(sorted(ics_subdomain_pages.items()))  # Sort alphabetically
     }
 
 def is_trap(url):
     """
     Detects URL patterns that might indicate a trap.
     """
-    parsed = urlparse(url)
-    path = parsed.path.lower()
-    query = parsed.query.lower()
+    parsed = parse_url(url)
+    if 'wiki' in parsed.path.lower() and "version" in parsed.query.lower():
+        return True
     
-    if 'wiki' in path and "version" in query:
+    if matches_trap_pattern(url):
+        print(f"Detected URL trap: {url}")
         return True
+
+    return False
+
+@lru_cache(maxsize=65536)
+def matches_trap_pattern(url):
+    """
+    The pattern checks behind is_trap, kept free of logging so results can
+    be cached: the same links show up on many pages of a site.
+    """
+    parsed = parse_url(url)
+    path = parsed.path.lower()
+    query = parsed.query.lower()
     
     # Skip important paths that shouldn't be considered traps
-    important_paths = {
-        '/seminars/', '/people/', '/faculty/', '/staff/',
-        '/research/', '/grad/', '/phd/', '/courses/',
-        '/news/', '/contact/', '/about/', '/explore/',
-        '/seminar-series/', '/chairs-message/', '/what-is-statistics/',
-        '/tutoring-resources/', '/m-s-ph-d-in-statistics/',
-        '/grad-student-directory/', '/minor-in-statistics/'
-    }
-    if any(path.startswith(p) for p in important_paths):
+    if path.startswith(TRAP_EXEMPT_PATH_PREFIXES):
         return False
 
     # Skip root paths
-    if path in ['/', '', '/index.html', '/index.htm']:
+    if path in ROOT_PATHS:
         return False
 
     # Skip faculty/staff personal pages
     if '~' in path:
         return False
 
-    # Check actual trap patterns
-    if any([
-        # Date path traps
-        re.search(r'/\d{4}/\d{2}/\d{2}/', path),
-        re.search(r'/\d{4}/\d{2}/', path),
-
+    # Check actual trap patterns, cheapest first
+    return bool(
         # Long query parameters
-        len(parsed.query) > 100,
+        len(parsed.query) > 100
 
         # Too many query parameters
-        parsed.query.count('&') > 5,
+        or parsed.query.count('&') > 5
+
+        # Duplicate key parameters
+        or query.count('do=') > 1
+        or query.count('from=') > 1
+
+        # Date path traps
+        or DATE_PATH_RE.search(path)
 
         # Wiki related traps
-        re.search(r'\?do=(index|revisions|diff|backlink)', query),
+        or WIKI_ACTION_RE.search(query)
 
         # Timestamp traps
-        re.search(r'from=\d{4}-\d{2}-\d{2}', query),
-        re.search(r'precision=(second|minute|hour)', query),
+        or TIMESTAMP_QUERY_RE.search(query)
+    )
 
-        # Duplicate key parameters
-        len(re.findall(r'do=', query)) > 1,
-        len(re.findall(r'from=', query)) > 1
-    ]):
-        print(f"Detected URL trap: {url}")
-        return True
+def is_similarity_exempt(parsed):
+    """
+    Faculty/staff personal pages and important pages are never treated as
+    duplicates
+    """
+    return '~' in parsed.path or bool(SIMILARITY_EXEMPT_PATH_RE.search(parsed.path.lower()))
 
+def seen_exact_hash(exact_hash):
+    """
+    Records exact_hash among the recent exact hashes and returns whether it
+    was already there
+    """
+    with fingerprint_lock:
+        if exact_hash in exact_hashes:
+            return True
+        if len(exact_hash_order) == exact_hash_order.maxlen:
+            exact_hashes.discard(exact_hash_order[0])  # About to be evicted
+        exact_hash_order.append(exact_hash)
+        exact_hashes.add(exact_hash)
     return False
 
-def is_similar_content(text, url, threshold=0.1):
+def is_duplicate_response(url, content):
     """
-    Check if content is too similar to previously seen pages using SimHash
+    Check if the raw response body is an exact copy of a recent one, so
+    byte-identical pages are rejected before they are parsed. Pages exempt
+    from the similarity check are exempt here too.
     """
-    # Skip similarity check for faculty pages
-    parsed = urlparse(url)
-    if '~' in parsed.path:  # Faculty/staff personal pages
+    if is_similarity_exempt(parse_url(url)):
         return False
-        
-    # Skip similarity check for important pages
-    important_paths = {
-        '/explore/', '/about/', '/faculty/', '/staff/',
-        '/research/', '/grad/', '/phd/', '/courses/',
-        '/people/', '/contact/', '/news/'
-    }
-    if any(path in parsed.path.lower() for path in important_paths):
+    if seen_exact_hash(xxh3_64_intdigest(content)):
+        print(f"Duplicate response detected: {url}")
+        return True
+    return False
+
+def is_similar_content(text, url, threshold=SIMILARITY_THRESHOLD):
+    """
+    Check if content is too similar to previously seen pages using SimHash.
+    threshold is a Hamming distance in bits: stored fingerprints fewer than
+    threshold bits away from this page's count as similar.
+    """
+    parsed = parse_url(url)
+    if is_similarity_exempt(parsed):
         return False
     
+    # Exact copies of a recent page, on any domain, are caught by a plain
+    # hash of the text before any SimHash work
+    if seen_exact_hash(xxh3_64_intdigest(text.encode('utf-8', errors='ignore'))):
+        print(f"Duplicate content detected: {url}")
+        return True
+    
     # Only compare with pages from the same domain
     domain = parsed.netloc
     
     current_hash = SimHash(text)
-    similar_count = 0
-    
-    # Compare with existing fingerprints
-    for stored_url, stored_hash in content_fingerprints:
-        if urlparse(stored_url).netloc == domain:  # Same domain comparison
-            if current_hash.distance(stored_hash) < threshold:
-                similar_count += 1
-                if similar_count >= 3:  # Require multiple similar pages
-                    print(f"Similar content detected: {url} is similar to {stored_url}")
-                    return True
     
-    # Add current fingerprint to collection
-    content_fingerprints.append((url, current_hash))
-    if len(content_fingerprints) > 1000:  # Limit memory usage
-        content_fingerprints.pop(0)
+    global fingerprint_next
+    with fingerprint_lock:
+        domain_id = domain_ids.setdefault(domain, len(domain_ids))
+        
+        # Require multiple similar pages, so a domain with fewer stored
+        # fingerprints than that is not compared at all
+        if domain_fingerprint_counts[domain_id] >= 3:
+            # Hamming distance to every stored fingerprint at once
+            distances = popcount_array(fingerprint_values ^ np.uint64(current_hash.hash_value))
+            # Same domain comparison
+            similar = np.flatnonzero((fingerprint_domains == domain_id) & (distances < threshold))
+            if len(similar) >= 3:
+                # Name the third match in the order the pages were stored
+                oldest_first = similar[np.argsort((similar - fingerprint_next) % MAX_FINGERPRINTS)]
+                print(f"Similar content detected: {url} is similar to {fingerprint_urls[oldest_first[2]]}")
+                return True
+        
+        # Add current fingerprint to collection, replacing the oldest one
+        evicted_domain = int(fingerprint_domains[fingerprint_next])
+        if evicted_domain >= 0:
+            domain_fingerprint_counts[evicted_domain] -= 1
+        domain_fingerprint_counts[domain_id] += 1
+        fingerprint_values[fingerprint_next] = current_hash.hash_value
+        fingerprint_domains[fingerprint_next] = domain_id
+        fingerprint_urls[fingerprint_next] = url
+        fingerprint_next = (fingerprint_next + 1) % MAX_FINGERPRINTS
     
     return False
 
+def get_robots_parser(base_url, config):
+    """
+    Returns the robots.txt parser for a host, fetching it through the cache
+    server only when the host has no fresh entry. Entries are keyed by host,
+    so http and https share one. None means the host has no usable
+    robots.txt, so everything is allowed.
+    """
+    host = base_url.partition('://')[2].lower()
+    now = time.time()
+    with robots_lock:
+        entry = robots_cache.get(host)
+        if entry is not None and entry[0] > now:
+            robots_cache.move_to_end(host)
+            return entry[1]
+    
+    # Fetched without the lock; at worst two workers fetch the same file
+    rp = None
+    robots_resp = download(f"{base_url}/robots.txt", config)
+    if robots_resp.status == 200 and robots_resp.raw_response:
+        rp = urllib.robotparser.RobotFileParser()
+        # A cut may split a multi-byte character, so undecodable bytes are dropped
+        content = robots_resp.raw_response.content[:ROBOTS_MAX_SIZE]
+        rp.parse(content.decode('utf-8', errors='ignore').splitlines())
+    # Server and cache server errors (5xx, 6xx) may be transient, so retry them sooner
+    ttl = ROBOTS_TTL if robots_resp.status < 500 else ROBOTS_ERROR_TTL
+    
+    with robots_lock:
+        robots_cache[host] = (now + ttl, rp)
+        robots_cache.move_to_end(host)
+        while len(robots_cache) > ROBOTS_CACHE_SIZE:
+            robots_cache.popitem(last=False)  # Least recently used
+    return rp
+
 def is_allowed_by_robots(url, config):
     """
     Checks if URL is allowed by robots.txt using cache server
     """
     try:
-        parsed = urlparse(url)
+        parsed = parse_url(url)
         base_url = f"{parsed.scheme}://{parsed.netloc}"
         
-        # Check cache first
-        if base_url in robots_cache:
-            return robots_cache[base_url].can_fetch("*", url)
-            
-        # Only fetch robots.txt if not in cache
-        rp = urllib.robotparser.RobotFileParser()
-        robots_url = f"{base_url}/robots.txt"
-        
-        # Use provided config
-        robots_resp = download(robots_url, config)
-        if robots_resp.status == 200 and robots_resp.raw_response:
-            rp.parse(robots_resp.raw_response.content.decode('utf-8').splitlines())
-            robots_cache[base_url] = rp
-            return rp.can_fetch("*", url)
-        
+        rp = get_robots_parser(base_url, config)
         # If robots.txt not found, allow access
-        return True
+        return rp is None or rp.can_fetch("*", url)
         
     except Exception as e:
         print(f"Error checking robots.txt for {url}: {e}")
@@ -481,10 +779,19 @@ def is_allowed_by_robots(url, config):
 
 
 
+def filter_urls(urls):
+    """
+    Returns the URLs of a batch that pass is_valid and are not traps,
+    keeping their order.
+    """
+    return [url for url in urls if is_valid(url) and not is_trap(url)]
+
+@lru_cache(maxsize=65536)
 def is_valid(url):
     """
     Strictly validates URLs against allowed domains and paths.
     Only allows *.ics.uci.edu/*, *.cs.uci.edu/*, *.informatics.uci.edu/*, *.stat.uci.edu/*
+    Results are cached, since the same links are seen again and again.
     """
     try:
 
@@ -492,79 +799,25 @@ def is_valid(url):
         url = ' '.join(url.split())
         url = url.replace(' ', '')
 
-        parsed = urlparse(url)
+        parsed = parse_url(url)
         
         # Check scheme
         if parsed.scheme not in {'http', 'https'}:
             return False
             
-        # Strict domain validation
+        # Strict domain validation: exact match or subdomain
         domain = parsed.netloc.lower()
-        allowed_domains = {
-            'ics.uci.edu',
-            'cs.uci.edu',
-            'informatics.uci.edu',
-            'stat.uci.edu'
-        }
-        
-        # Check if domain matches any of the allowed patterns
-        is_allowed = False
-        for allowed_domain in allowed_domains:
-            # Check exact match or subdomain
-            if domain == allowed_domain or domain.endswith('.' + allowed_domain):
-                is_allowed = True
-                break
-                
-        if not is_allowed:
+        if domain not in ALLOWED_DOMAINS and not domain.endswith(ALLOWED_DOMAIN_SUFFIXES):
             return False
             
-        # File extension filtering
-        invalid_extensions = {
-            # Documents
-            'pdf', 'doc', 'docx', 'ppt', 'pptx', 'ppsx', 'xls', 'xlsx', 'csv',
-            'txt', 'rtf', 'odc', 'odt', 'ods', 'odp', 'tex', 'ps', 'eps', 'cls', 'bib',
-            # Images
-            'jpg', 'jpeg', 'png', 'gif', 'bmp', 'tiff', 'ico', 'svg', 'webp', 'heic', 'heif', 'hevc', 'avif', 'img',
-            # Audio/Video
-            'mp3', 'mp4', 'wav', 'avi', 'mov', 'wmv', 'flv', 'mkv', 'webm',
-            'mpg', 'mpeg', 'm4v', '3gp', 'ogg', 'ogv',
-            # Archives
-            'zip', 'rar', 'gz', 'tar', '7z', 'bz2', 'xz', 'deb', 'rpm', 'msi', 'apk',
-            # Web assets
-            'css', 'js', 'json', 'xml', 'rss', 'atom', 'php', 'war', 'tgz',
-            # Other
-            'exe', 'dll', 'so', 'dmg', 'iso', 'bin', 'swf', 'woff', 'woff2', 'eot', 'ttf', 'fig', 'ss',
-            'rkt', 'py', 'data', 'java', 'hqx', 'lif', 'asp', 'lca', 'pq', 'hash', 'shar', 'cp', 'ma', 'tif', 'db',
-            'cpp', 'diff', 'dtd', 'emx', 'ff', 'grm', 'in', 'io', 'lsp', 'mat', 'nb', 'pov', 'pps', 'rle', 'rls', 'sas',
-            'scm', 'sh', 'sql', 'uai', 
-        }
-        # Check if URL contains any invalid extensions
-        url_lower = url.lower()
-        for ext in invalid_extensions:
-            if f'.{ext}' in url_lower:
-                return False
-        
         path = parsed.path.lower()
-        # Filter out resource directories
-        if any(x in path.lower() for x in [
-            '/images/', '/img/', '/media/', 
-            '/video/', '/audio/', '/download/',
-            '/css/', '/js/', '/assets/', '/fonts/',
-            '/static/', '/uploads/', '/files/', '/bibs/', '/publications/', '/docs/', '/papers/', '/pdfs/'
-        ]):
+        # File extension filtering on the last path segment only
+        if posixpath.splitext(path)[1][1:] in INVALID_EXTENSIONS:
             return False
-                
-        # Avoid calendar and event traps
-        if re.search(r'/calendar/|/events?/|/archive/', path):
-            return False
-            
-        # Avoid specific problematic paths
-        if any(x in path for x in [
-            '/login', '/logout', '/search', '/print/',
-            '/feed', '/rss', '/atom', '/api/', '/ajax/',
-            '/cgi-bin/', '/wp-content/',
-            '/admin/', '/backup/', '/raw/',
-        ]):
+        
+        # Filter out resource directories, calendar and event traps, and
+        # specific problematic paths
+        if REJECTED_PATH_RE.search(path):
             return False
             
         # Avoid URLs that are too long
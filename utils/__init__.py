@@ -1,6 +1,6 @@
 import os
 import logging
-from hashlib import sha256
+from xxhash import xxh3_64_hexdigest
 from urllib.parse import urlparse
 
 def get_logger(name, filename=None):
@@ -25,9 +25,26 @@ def get_logger(name, filename=None):
 def get_urlhash(url):
     parsed = urlparse(url)
     # everything other than scheme.
-    return sha256(
+    # The hash is only a dedup key, so a fast non-cryptographic hash is enough.
+    return xxh3_64_hexdigest(
         f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
-        f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
+        f"{parsed.query}/{parsed.fragment}".encode("utf-8"))
+
+def get_netloc(url):
+    """
+    Return the netloc of an absolute url, same as urlparse(url).netloc,
+    without building a full ParseResult.
+    """
+    start = url.find("://")
+    if start == -1:
+        return ""
+    start += 3
+    end = len(url)
+    for delimiter in "/?#":
+        index = url.find(delimiter, start, end)
+        if index != -1:
+            end = index
+    return url[start:end]
 
 def normalize(url):
     if url.endswith("/"):
@@ -1,12 +1,25 @@
 import requests
 import cbor
 import time
+import threading
 
 from utils.response import Response
 
+# Every download goes to the same cache server, so each worker thread keeps
+# one keep-alive session instead of opening a new connection per request
+_sessions = threading.local()
+
+def get_session():
+    """Return the calling thread's requests session, creating it on first use"""
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = requests.Session()
+        _sessions.session = session
+    return session
+
 def download(url, config, logger=None):
     host, port = config.cache_server
-    resp = requests.get(
+    resp = get_session().get(
         f"http://{host}:{port}/",
         params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
     try: